@@ -9,24 +9,101 @@ https://sopel.chat
 """
 from __future__ import annotations
 
+from collections import Counter
+from contextlib import contextmanager
 import operator
 import random
 import re
+import threading
 import time
-from typing import TYPE_CHECKING, Optional, List, Tuple
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional, List, Tuple
+
+from sqlalchemy import event, inspect
 
 from sopel import plugin
+from sopel.config import types
 from sopel.tools.calculation import eval_equation
 
 if TYPE_CHECKING:
-    from sopel.bot import SopelWrapper
+    import sqlite3
+
+    from sopel.bot import Sopel, SopelWrapper
     from sopel.trigger import Trigger
 
 MAX_DICE = 1000
+# random.choices() scales a 53-bit float to the number of faces, which skews
+# the odds of each face by up to about faces / 2**53; past this size, dice are
+# rolled with randint() instead, which is exactly uniform
+MAX_CHOICES_FACES = 2 ** 32
+DICE_REGEX = re.compile(r"""
+    (?P<dice_num>-?\d*)
+    d
+    (?P<dice_type>-?\d+)
+    (?:v(?P<drop_lowest>-?\d+))?
+""", re.IGNORECASE | re.VERBOSE)
 
 # Number of seconds a high score remains valid (7 days)
 WEEK_SECONDS = 7 * 24 * 60 * 60
 
+# Minimum number of seconds between two purges of expired high scores
+PURGE_INTERVAL = 5 * 60
+
+_last_purge = 0
+_purge_lock = threading.Lock()
+
+# Keep the stored score unless the new one beats it or the old one expired
+# (requires SQLite 3.24+)
+_UPSERT_HIGHSCORE = """
+    INSERT INTO dice_highscores(channel, nick_lower, nick_display, score, set_at)
+    VALUES (?,?,?,?,?)
+    ON CONFLICT(channel, nick_lower) DO UPDATE
+    SET nick_display = excluded.nick_display,
+        score = excluded.score,
+        set_at = excluded.set_at
+    WHERE excluded.score > dice_highscores.score
+       OR dice_highscores.set_at < excluded.set_at - %d
+""" % WEEK_SECONDS
+
+_CREATE_HIGHSCORES_TABLE = """
+    CREATE TABLE IF NOT EXISTS dice_highscores (
+        channel TEXT NOT NULL,
+        nick_lower TEXT NOT NULL,
+        nick_display TEXT NOT NULL,
+        score INTEGER NOT NULL,
+        set_at INTEGER NOT NULL,
+        PRIMARY KEY(channel, nick_lower)
+    )
+"""
+
+
+class DiceSection(types.StaticSection):
+    sqlite_fast_writes = types.BooleanAttribute(
+        'sqlite_fast_writes', default=False)
+    """Switch the bot's SQLite database to WAL with ``synchronous=NORMAL``.
+
+    This applies to the whole database Sopel and all of its plugins share,
+    not only to dice scores: writes no longer wait on an fsync and readers
+    are not blocked by writers, but the last few commits of any data can be
+    lost on power failure. SQLite also keeps ``-wal`` and ``-shm`` files next
+    to the database file.
+
+    The journal mode is stored in the database file, so turning this off
+    again does not switch it back from WAL.
+    """
+
+
+def configure(settings):
+    """
+    | name | example | purpose |
+    | ---- | ------- | ------- |
+    | sqlite_fast_writes | False | Trade durability of the bot's whole SQLite database for faster writes. |
+    """
+    settings.define_section('dice', DiceSection)
+    settings.dice.configure_setting(
+        'sqlite_fast_writes',
+        'Use WAL and synchronous=NORMAL for the whole SQLite database?')
+
+
 # ---------------------------------------------------------------------------
 # Scoreboard persistence helpers
 # ---------------------------------------------------------------------------
@@ -37,66 +114,238 @@ def setup(bot):  # Sopel calls this if present
     Table schema (SQLite by default):
         dice_highscores(
             channel TEXT NOT NULL,
-            nick TEXT NOT NULL,
+            nick_lower TEXT NOT NULL,  -- IRC-lowercased, for lookups
+            nick_display TEXT NOT NULL,  -- as typed by the user, for display
             score INTEGER NOT NULL,
             set_at INTEGER NOT NULL,  -- epoch seconds
-            PRIMARY KEY(channel, nick)
+            PRIMARY KEY(channel, nick_lower)
+        )
+        ix_dice_hs_rank ON dice_highscores(
+            channel, score DESC, set_at ASC, nick_display
         )
+
+    Nicks are case-insensitive on IRC, so scores are keyed by the nick
+    lowercased with the bot's casemapping. A table from before ``nick_lower``
+    existed is migrated in place, keeping the best score of each folded nick.
+
+    The ``ix_dice_hs_rank`` index matches the ordering of the channel ranking
+    and covers all of its columns, so the top scores are read straight from
+    the index without sorting.
+
+    With ``sqlite_fast_writes`` enabled, an SQLite database is switched to WAL
+    journaling with ``synchronous=NORMAL``: commits no longer wait on an
+    fsync, and readers are not blocked by a roll being written. This changes
+    the durability of all of Sopel's data, not only of dice scores: the
+    database stays consistent after a crash, but the last few commits of
+    any plugin can be lost on power failure.
     """
+    bot.settings.define_section('dice', DiceSection)
     db = bot.db
+    inspector = inspect(db.engine)
+    if inspector.has_table('dice_highscores'):
+        columns = {col['name'] for col in inspector.get_columns('dice_highscores')}
+        if 'nick_lower' not in columns:
+            _migrate_nick_lower(bot)
+    db.execute(_CREATE_HIGHSCORES_TABLE)
     db.execute(
         """
-        CREATE TABLE IF NOT EXISTS dice_highscores (
-            channel TEXT NOT NULL,
-            nick TEXT NOT NULL,
-            score INTEGER NOT NULL,
-            set_at INTEGER NOT NULL,
-            PRIMARY KEY(channel, nick)
-        )
+        CREATE INDEX IF NOT EXISTS ix_dice_hs_rank
+        ON dice_highscores(channel, score DESC, set_at ASC, nick_display)
         """
     )
+    if (
+        bot.settings.dice.sqlite_fast_writes
+        and db.get_uri().get_backend_name() == 'sqlite'
+    ):
+        # journal_mode is stored in the database file, but synchronous must be
+        # set again on every new connection
+        db.execute('PRAGMA journal_mode=WAL')
+        if not event.contains(db.engine, 'connect', _set_sqlite_synchronous):
+            event.listen(db.engine, 'connect', _set_sqlite_synchronous)
+
+
+def shutdown(bot):
+    # the engine outlives the plugin: don't leave a reloaded module's listener
+    # behind, next to the one its setup() will add
+    if event.contains(bot.db.engine, 'connect', _set_sqlite_synchronous):
+        event.remove(bot.db.engine, 'connect', _set_sqlite_synchronous)
+
+
+def _migrate_nick_lower(bot: Sopel | SopelWrapper) -> None:
+    """Rebuild a case-sensitive ``(channel, nick)`` table keyed by nick_lower."""
+    with _highscores_transaction(bot) as cursor:
+        # expired rows are left out: a higher but expired score must not
+        # replace the still valid score of a nick folding to the same one
+        cursor.execute(
+            """
+            SELECT channel, nick, score, set_at FROM dice_highscores
+            WHERE set_at >= ?
+            """,
+            (int(time.time()) - WEEK_SECONDS,),
+        )
+        rows = cursor.fetchall()
+        cursor.execute("DROP INDEX IF EXISTS ix_dice_hs_rank")
+        cursor.execute("DROP TABLE dice_highscores")
+        cursor.execute(_CREATE_HIGHSCORES_TABLE)
+        # nicks that now fold together keep their best score
+        _bulk_update_highscores(bot, rows, cursor)
+
+
+def _set_sqlite_synchronous(
+    dbapi_connection: sqlite3.Connection, connection_record: object,
+) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute('PRAGMA synchronous=NORMAL')
+    finally:
+        cursor.close()
+
 
+def _purge_due(now: int) -> bool:
+    """Tell if expired highscores should be purged now, and claim the purge.
+
+    Plugin callables run in their own threads, so the check and the update of
+    the last purge time are done under a lock. If the purge then fails, it
+    must be released with :func:`_purge_failed`.
+    """
+    global _last_purge
+    with _purge_lock:
+        if now - _last_purge < PURGE_INTERVAL:
+            return False
+        _last_purge = now
+        return True
 
-def _purge_expired(bot, now: Optional[int] = None) -> None:
-    """Remove expired (older than 7 days) highscores."""
+
+def _purge_failed(now: int) -> None:
+    """Release the purge claimed at ``now``, so that the next one runs."""
+    global _last_purge
+    with _purge_lock:
+        # unless another purge was claimed since
+        if _last_purge == now:
+            _last_purge = 0
+
+
+def _purge_expired(bot: Sopel | SopelWrapper, now: Optional[int] = None) -> None:
+    """Remove expired (older than 7 days) highscores.
+
+    This is a no-op if the last purge ran less than ``PURGE_INTERVAL`` seconds
+    ago; queries must still filter out expired rows by themselves.
+    """
     if now is None:
         now = int(time.time())
+    if not _purge_due(now):
+        return
     threshold = now - WEEK_SECONDS
-    bot.db.execute("DELETE FROM dice_highscores WHERE set_at < ?", (threshold,))
+    try:
+        bot.db.execute(
+            "DELETE FROM dice_highscores WHERE set_at < ?", (threshold,))
+    except Exception:
+        _purge_failed(now)
+        raise
 
 
-def _update_highscore(bot, channel: str, nick: str, score: int, now: Optional[int] = None) -> Optional[int]:
+def _fold_nick(bot: Sopel | SopelWrapper, nick: str) -> str:
+    """Lowercase ``nick`` with the bot's casemapping, as stored in nick_lower."""
+    return bot.make_identifier(nick).lower()
+
+
+def _highscore_row(
+    bot: Sopel | SopelWrapper, channel: str, nick: str, score: int, set_at: int,
+) -> Tuple[str, str, str, int, int]:
+    """Build the parameters of :data:`_UPSERT_HIGHSCORE` for one roll."""
+    return (channel, _fold_nick(bot, nick), str(nick), score, set_at)
+
+
+@contextmanager
+def _highscores_transaction(
+    bot: Sopel | SopelWrapper,
+) -> Iterator[sqlite3.Cursor]:
+    """Yield a cursor inside a write transaction on the bot's database.
+
+    The write lock is taken up front (``BEGIN IMMEDIATE``) so that reads made
+    in the transaction can't be invalidated by a concurrent roll. The
+    transaction is committed on exit, or rolled back on error.
+    """
+    conn = bot.db.connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        yield cursor
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def _bulk_update_highscores(
+    bot: Sopel | SopelWrapper,
+    rows: Iterable[Tuple[str, str, int, int]],
+    cursor: Optional[sqlite3.Cursor] = None,
+) -> None:
+    """Record many ``(channel, nick, score, set_at)`` rolls at once.
+
+    Each roll only replaces the stored weekly high score if it beats it, or if
+    the stored one has expired. All rows are written with a single
+    ``executemany``, in the transaction of ``cursor`` if given, or else in a
+    new one.
+    """
+    if cursor is None:
+        with _highscores_transaction(bot) as cursor:
+            _bulk_update_highscores(bot, rows, cursor)
+        return
+    cursor.executemany(
+        _UPSERT_HIGHSCORE, (_highscore_row(bot, *row) for row in rows))
+
+
+def _update_highscore(bot: Sopel | SopelWrapper, channel: str, nick: str, score: int, now: Optional[int] = None) -> Optional[int]:
     """Update a user's weekly high score for a channel if improved.
 
     Returns the previous best score (still valid) or None if none existed.
+
+    Expired scores are purged (see :func:`_purge_expired`), the previous score
+    is looked up, and the new score is upserted in a single transaction.
     """
     if now is None:
         now = int(time.time())
-    _purge_expired(bot, now)
-    row = bot.db.execute(
-        "SELECT score, set_at FROM dice_highscores WHERE channel = ? AND nick = ?",
-        (channel, nick),
-    ).fetchone()
-    prev_score: Optional[int] = None
-    if row is not None:
-        prev_score_val, set_at = row
-        if set_at >= now - WEEK_SECONDS:
-            prev_score = prev_score_val
-    if prev_score is None or score > prev_score:
-        bot.db.execute(
-            "REPLACE INTO dice_highscores(channel, nick, score, set_at) VALUES (?,?,?,?)",
-            (channel, nick, score, now),
-        )
-        return prev_score
-    return prev_score
-
-
-def _get_channel_highscores(bot, channel: str, limit: int = 10) -> List[Tuple[str, int, int]]:
+    threshold = now - WEEK_SECONDS
+    nick_lower = _fold_nick(bot, nick)
+    purge = _purge_due(now)
+    try:
+        with _highscores_transaction(bot) as cursor:
+            if purge:
+                cursor.execute(
+                    "DELETE FROM dice_highscores WHERE set_at < ?",
+                    (threshold,),
+                )
+            cursor.execute(
+                """
+                SELECT score FROM dice_highscores
+                WHERE channel = ? AND nick_lower = ? AND set_at >= ?
+                """,
+                (channel, nick_lower, threshold),
+            )
+            previous = cursor.fetchone()
+            _bulk_update_highscores(
+                bot, [(channel, nick, score, now)], cursor)
+    except Exception:
+        # the purge was rolled back with the rest of the transaction
+        if purge:
+            _purge_failed(now)
+        raise
+
+    if previous is None:
+        return None
+    return previous[0]
+
+
+def _get_channel_highscores(bot: Sopel | SopelWrapper, channel: str, limit: int = 10) -> List[Tuple[str, int, int]]:
     now = int(time.time())
     _purge_expired(bot, now)
     return bot.db.execute(
         """
-        SELECT nick, score, set_at FROM dice_highscores
+        SELECT nick_display, score, set_at FROM dice_highscores
         WHERE channel = ? AND set_at >= ?
         ORDER BY score DESC, set_at ASC
         LIMIT ?
@@ -105,16 +354,15 @@ def _get_channel_highscores(bot, channel: str, limit: int = 10) -> List[Tuple[st
     ).fetchall()
 
 
+_AGE_UNITS = ((86400, 'd'), (3600, 'h'), (60, 'm'))
+
+
 def _format_age(seconds: int) -> str:
-    days = seconds // 86400
-    if days > 0:
-        return f"{days}d"
-    hours = seconds // 3600
-    if hours > 0:
-        return f"{hours}h"
-    minutes = seconds // 60
-    if minutes > 0:
-        return f"{minutes}m"
+    # largest unit first, stopping at the first one that fits
+    for unit_seconds, suffix in _AGE_UNITS:
+        value = seconds // unit_seconds
+        if value > 0:
+            return f"{value}{suffix}"
     return f"{seconds}s"
 
 # ---------------------------------------------------------------------------
@@ -122,6 +370,8 @@ def _format_age(seconds: int) -> str:
 # ---------------------------------------------------------------------------
 
 class DicePouch:
+    __slots__ = ('num', 'type', 'dice', 'dropped')
+
     def __init__(self, dice_count: int, dice_type: int) -> None:
         """Initialize dice pouch and roll the dice.
 
@@ -130,50 +380,57 @@ class DicePouch:
         """
         self.num: int = dice_count
         self.type: int = dice_type
-        self.dice: dict[int, int] = {}
-        self.dropped: dict[int, int] = {}
+        # both are set by roll_dice()
+        self.dice: dict[int, int]
+        self.dropped: dict[int, int]
         self.roll_dice()
 
     def roll_dice(self) -> None:
         """Roll all the dice in the pouch."""
-        self.dice = {}
         self.dropped = {}
-        for __ in range(self.num):
-            number = random.randint(1, self.type)
-            count = self.dice.setdefault(number, 0)
-            self.dice[number] = count + 1
+        # draw every die in one call and let Counter tally them in C, rather
+        # than calling randint() and updating the dict once per die; faces are
+        # stored in ascending order so drop_lowest() never has to sort them
+        if self.type <= MAX_CHOICES_FACES:
+            rolls = random.choices(range(1, self.type + 1), k=self.num)
+        else:
+            rolls = [random.randint(1, self.type) for _ in range(self.num)]
+        self.dice = dict(sorted(Counter(rolls).items()))
 
     def drop_lowest(self, n: int) -> None:
         """Drop ``n`` lowest dice from the result.
 
         :param n: the number of dice to drop
+
+        The faces in :attr:`dice` must be in ascending order, as
+        :meth:`roll_dice` stores them.
         """
-        sorted_x = sorted(self.dice.items(), key=operator.itemgetter(0))
-        for i, count in sorted_x:
-            count = self.dice[i]
+        for face, count in list(self.dice.items()):
             if n == 0:
                 break
             elif n < count:
-                self.dice[i] = count - n
-                self.dropped[i] = n
+                self.dice[face] = count - n
+                self.dropped[face] = n
                 break
             else:
-                self.dice[i] = 0
-                self.dropped[i] = count
+                del self.dice[face]
+                self.dropped[face] = count
                 n = n - count
-        for i, count in list(self.dropped.items()):
-            if self.dice.get(i, 0) == 0 and i in self.dice:
-                del self.dice[i]
 
     def get_simple_string(self) -> str:
-        """Return the values of the dice like (2+2+2[+1+1])."""
-        dice = self.dice.items()
-        faces = ("+".join([str(face)] * times) for face, times in dice)
+        """Return the values of the dice like (2+2+2[+1+1]).
+
+        Dice are listed by ascending face, not in the order they were rolled.
+        """
+        faces: list[str] = []
+        for face, times in self.dice.items():
+            faces.extend([str(face)] * times)
         dice_str = "+".join(faces)
         dropped_str = ""
         if self.dropped:
-            dropped = self.dropped.items()
-            dfaces = ("+".join([str(face)] * times) for face, times in dropped)
+            dfaces: list[str] = []
+            for face, times in self.dropped.items():
+                dfaces.extend([str(face)] * times)
             dropped_str = "[+%s]" % ("+".join(dfaces),)
         return "(%s%s)" % (dice_str, dropped_str)
 
@@ -191,10 +448,7 @@ class DicePouch:
 
     def get_sum(self) -> int:
         """Get the sum of non-dropped dice."""
-        result = 0
-        for face, times in self.dice.items():
-            result += face * times
-        return result
+        return sum(map(operator.mul, self.dice, self.dice.values()))
 
     def get_number_of_faces(self) -> int:
         """Returns sum of different faces for dropped and not dropped dice.
@@ -308,27 +562,15 @@ def roll(bot: SopelWrapper, trigger: Trigger) -> None:
     number of lowest dice to be dropped from the result. N is the constant to
     be applied to the end result. Comment is for easily noting the purpose.
     """
-    dice_regexp = r"""
-        (?P<dice_num>-?\d*)
-        d
-        (?P<dice_type>-?\d+)
-        (v(?P<drop_lowest>-?\d+))?
-    """
-
     if not trigger.group(2):
         bot.reply("No dice to roll.")
         return
 
     arg_str_raw = trigger.group(2).split("#", 1)[0].strip()
     arg_str = arg_str_raw.replace("%", "%%")
-    arg_str = re.sub(
-        dice_regexp, "%s", arg_str, flags=re.IGNORECASE | re.VERBOSE
-    )
+    arg_str = DICE_REGEX.sub("%s", arg_str)
 
-    dice_expressions = [
-        match
-        for match in re.finditer(dice_regexp, arg_str_raw, re.IGNORECASE | re.VERBOSE)
-    ]
+    dice_expressions = list(DICE_REGEX.finditer(arg_str_raw))
 
     if not dice_expressions:
         bot.reply("I couldn't find any valid dice expressions.")
@@ -412,8 +654,8 @@ def my_highscore(bot: SopelWrapper, trigger: Trigger) -> None:
     now = int(time.time())
     _purge_expired(bot, now)
     row = bot.db.execute(
-        'SELECT score, set_at FROM dice_highscores WHERE channel = ? AND nick = ?',
-        (channel, trigger.nick),
+        'SELECT score, set_at FROM dice_highscores WHERE channel = ? AND nick_lower = ?',
+        (channel, _fold_nick(bot, trigger.nick)),
     ).fetchone()
     if row is None or row[1] < now - WEEK_SECONDS:
         bot.say(f"{trigger.nick}: you don't have a weekly high score yet. Roll!")
@@ -68,16 +68,29 @@ def setup(bot):
         'ey/em': 'ey/em/eir/eirs/eirself',
     }
 
-    if not bot.settings.pronouns.fetch_complete_list:
-        return
+    if bot.settings.pronouns.fetch_complete_list:
+        _fetch_pronoun_sets(bot)
+
+    _index_pronoun_sets(bot)
 
-    # and now try to get the current list our fork of the backend uses
+
+def _fetch_pronoun_sets(bot):
+    # try to get the current list our fork of the backend uses
     # (https://github.com/sopel-irc/pronoun-service)
     try:
-        r = requests.get(
-            'https://github.com/sopel-irc/pronoun-service/raw/main/src/lib/data/pronouns.tab')
-        r.raise_for_status()
-        fetched_pairs = _process_pronoun_sets(r.text.splitlines())
+        # stream the list into the trie line by line instead of holding the
+        # whole response body in memory; don't let a stalled server hang startup
+        with requests.get(
+            'https://github.com/sopel-irc/pronoun-service/raw/main/src/lib/data/pronouns.tab',
+            stream=True,
+            timeout=(5, 5),
+        ) as r:
+            r.raise_for_status()
+            if r.encoding is None:
+                r.encoding = 'utf-8'
+            lines = r.iter_lines(decode_unicode=True)
+            fetched_pairs = dict(
+                _process_pronoun_sets(line for line in lines if line))
     except requests.exceptions.RequestException:
         # don't do anything, just log the failure and use the hard-coded set
         LOGGER.exception("Couldn't fetch full pronouns list; using default set.")
@@ -87,7 +100,41 @@ def setup(bot):
         LOGGER.exception("Couldn't parse fetched pronouns; using default set.")
         return
     else:
-        bot.memory['pronoun_sets'] = dict(fetched_pairs)
+        bot.memory['pronoun_sets'] = fetched_pairs
+
+
+def _index_pronoun_sets(bot):
+    # map each full set back to its short form; if ambiguous, the earlier
+    # one is used, as documented in setup()
+    inverse: dict[str, str] = {}
+    # lookup tables for set_pronouns(), holding (position, set) entries so
+    # that matches can be put back in the order of the known sets
+    by_prefix: dict[str, list[tuple[int, str]]] = {}
+    by_subject_reflexive: dict[tuple[str, ...], list[tuple[int, str]]] = {}
+    by_subject_object_possessive: dict[
+        tuple[str, ...], list[tuple[int, str]]] = {}
+
+    for position, (short, set_) in enumerate(bot.memory['pronoun_sets'].items()):
+        inverse.setdefault(set_, short)
+
+        entry = (position, set_)
+        split_set = set_.split('/')
+        for i in range(1, len(split_set)):
+            by_prefix.setdefault('/'.join(split_set[:i]), []).append(entry)
+
+        if len(split_set) == 5:
+            # "they/.../themself"
+            by_subject_reflexive.setdefault(
+                (split_set[0], split_set[4]), []).append(entry)
+            # "they/them/theirs"
+            by_subject_object_possessive.setdefault(
+                (split_set[0], split_set[1], split_set[3]), []).append(entry)
+
+    bot.memory['pronoun_sets_inverse'] = inverse
+    bot.memory['pronoun_sets_by_prefix'] = by_prefix
+    bot.memory['pronoun_sets_by_subject_reflexive'] = by_subject_reflexive
+    bot.memory['pronoun_sets_by_subject_object_possessive'] = (
+        by_subject_object_possessive)
 
 
 def _process_pronoun_sets(set_list):
@@ -173,11 +220,7 @@ def pronouns(bot, trigger):
 
 
 def say_pronouns(bot, nick, pronouns):
-    for short, set_ in bot.memory['pronoun_sets'].items():
-        if pronouns == set_:
-            break
-        short = pronouns
-
+    short = bot.memory['pronoun_sets_inverse'].get(pronouns, pronouns)
     bot.say(
         "{nick}'s pronouns are {pronouns}. See {base_url}/{short} for examples."
         .format(
@@ -203,26 +246,22 @@ def set_pronouns(bot, trigger):
     disambig = ''
     requested_pronouns_split = requested_pronouns.split("/")
     if len(requested_pronouns_split) < 5:
-        matching = []
-        for known_pronoun_set in bot.memory['pronoun_sets'].values():
-            known_split_set = known_pronoun_set.split("/")
-            if known_pronoun_set.startswith(requested_pronouns + "/") or (
-                len(requested_pronouns_split) == 3
-                and (
-                    (
-                        # "they/.../themself"
-                        requested_pronouns_split[1] == "..."
-                        and requested_pronouns_split[0] == known_split_set[0]
-                        and requested_pronouns_split[2] == known_split_set[4]
-                    )
-                    or (
-                        # "they/them/theirs"
-                        requested_pronouns_split[:2] == known_split_set[:2]
-                        and requested_pronouns_split[2] == known_split_set[3]
-                    )
-                )
-            ):
-                matching.append(known_pronoun_set)
+        candidates = list(
+            bot.memory['pronoun_sets_by_prefix'].get(requested_pronouns, []))
+        if len(requested_pronouns_split) == 3:
+            subject, second, third = requested_pronouns_split
+            if second == "...":
+                # "they/.../themself"
+                candidates.extend(
+                    bot.memory['pronoun_sets_by_subject_reflexive'].get(
+                        (subject, third), []))
+            # "they/them/theirs"
+            candidates.extend(
+                bot.memory['pronoun_sets_by_subject_object_possessive'].get(
+                    (subject, second, third), []))
+
+        # a set can match more than one way; keep it once, in known order
+        matching = [known_set for _, known_set in sorted(set(candidates))]
 
         if not matching:
             bot.reply(
@@ -9,6 +9,7 @@
 from __future__ import annotations
 
 import datetime
+import functools
 from typing import cast, NamedTuple, Optional, TYPE_CHECKING, Union
 
 import pytz
@@ -27,6 +28,16 @@ DAYS = 24 * HOURS
 MONTHS = int(30.5 * DAYS)
 YEARS = 365 * DAYS
 
+# units used by seconds_to_human, from the largest to the smallest
+_HUMAN_UNITS = (
+    (YEARS, 'year'),
+    (MONTHS, 'month'),
+    (DAYS, 'day'),
+    (HOURS, 'hour'),
+    (MINUTES, 'minute'),
+    (SECONDS, 'second'),
+)
+
 
 class Duration(NamedTuple):
     """Named tuple representation of a duration.
@@ -57,6 +68,7 @@ class Duration(NamedTuple):
     """Seconds spent."""
 
 
+@functools.lru_cache(maxsize=4096)
 def validate_timezone(zone: Optional[str]) -> str:
     """Normalize and validate an IANA timezone name.
 
@@ -85,6 +97,11 @@ def validate_timezone(zone: Optional[str]) -> str:
         If ``zone`` is ``None``, raises a :exc:`ValueError` as if it was an
         empty string or an invalid timezone instead of returning ``None``.
 
+    .. versionchanged:: 8.1
+
+        Valid results are cached, so looking up the same ``zone`` again
+        doesn't go through ``pytz`` every time.
+
     """
     if zone is None:
         raise ValueError('Invalid time zone.')
@@ -98,6 +115,7 @@ def validate_timezone(zone: Optional[str]) -> str:
     return cast('str', tz.zone)
 
 
+@functools.lru_cache(maxsize=1024)
 def validate_format(tformat: str) -> str:
     """Validate a time format string.
 
@@ -106,6 +124,12 @@ def validate_format(tformat: str) -> str:
     :raise ValueError: when ``tformat`` is not a valid time format string
 
     .. versionadded:: 6.0
+
+    .. versionchanged:: 8.1
+
+        Valid results are cached, so a format string is only test-formatted
+        the first time it is seen.
+
     """
     try:
         time = datetime.datetime.now(datetime.timezone.utc)
@@ -216,6 +240,12 @@ def get_timezone(
     return tz
 
 
+@functools.lru_cache(maxsize=256)
+def _pytz_timezone(zone: str) -> datetime.tzinfo:
+    # pytz normalizes the name on every lookup before hitting its own cache
+    return pytz.timezone(zone)
+
+
 def format_time(
     db: Optional[SopelDB] = None,
     config: Optional[Config] = None,
@@ -264,7 +294,7 @@ def format_time(
 
     # get target timezone
     if zone:
-        target_tz = pytz.timezone(zone)
+        target_tz = _pytz_timezone(zone)
 
     # get format for nick or channel
     if db:
@@ -439,11 +469,16 @@ def seconds_to_human(
         # zero is a special case that the algorithm below won't handle correctly (#1841)
         result = "0 seconds"
     else:
-        result = ", ".join([
-            "%s %s" % (value, unit)
-            for value, unit in get_time_unit(*seconds_to_split(secs))
-            if value
-        ][:granularity])
+        parts: list[str] = []
+        for unit_seconds, unit_name in _HUMAN_UNITS:
+            if len(parts) >= granularity:
+                break
+            value, secs = divmod(secs, unit_seconds)
+            if value:
+                parts.append("%d %s%s" % (
+                    value, unit_name, "s" if value != 1 else ""))
+
+        result = ", ".join(parts)
 
     if future is False:
         result += " ago"
@@ -0,0 +1,274 @@
+"""Tests for Sopel's ``dice.score`` plugin"""
+from __future__ import annotations
+
+import importlib.util
+import os
+import sqlite3
+import sys
+import time
+
+import pytest
+from sqlalchemy import event
+
+import sopel.builtins
+
+
+TMP_CONFIG = """
+[core]
+owner = Uowner
+nick = TestBot
+enable = coretasks
+db_filename = {db_filename}
+"""
+
+NOW = 1_700_000_000
+
+
+@pytest.fixture(scope='module')
+def dice_score():
+    # the dot in the file name keeps it from being imported the usual way
+    path = os.path.join(
+        os.path.dirname(sopel.builtins.__file__), 'dice.score.py')
+    spec = importlib.util.spec_from_file_location('dice_score', path)
+    module = importlib.util.module_from_spec(spec)
+    # plugin.example() looks its module up in sys.modules while decorating
+    sys.modules[spec.name] = module
+    try:
+        spec.loader.exec_module(module)
+        yield module
+    finally:
+        sys.modules.pop(spec.name, None)
+
+
+@pytest.fixture
+def tmpconfig(configfactory, tmpdir):
+    content = TMP_CONFIG.format(db_filename=tmpdir.join('test.sqlite'))
+    return configfactory('default.cfg', content)
+
+
+@pytest.fixture
+def mockbot(tmpconfig, botfactory):
+    return botfactory(tmpconfig)
+
+
+@pytest.fixture
+def scorebot(dice_score, mockbot, monkeypatch):
+    dice_score.setup(mockbot)
+    # start every test with a purge due
+    monkeypatch.setattr(dice_score, '_last_purge', 0)
+    yield mockbot
+    dice_score.shutdown(mockbot)
+
+
+@pytest.fixture
+def pouch(dice_score):
+    pouch = dice_score.DicePouch(5, 6)
+    # faces in ascending order, as roll_dice() stores them
+    pouch.dice = {1: 2, 3: 1, 6: 2}
+    return pouch
+
+
+def _stored_scores(bot):
+    return bot.db.execute(
+        "SELECT channel, nick_lower, nick_display, score, set_at "
+        "FROM dice_highscores ORDER BY channel, nick_lower"
+    ).fetchall()
+
+
+@pytest.mark.parametrize('faces', (
+    6, 2 ** 32, 2 ** 32 + 1, 3 * 2 ** 51, 2 ** 53, 10 ** 19, 10 ** 400,
+))
+def test_dice_pouch_huge_faces(dice_score, faces):
+    pouch = dice_score.DicePouch(3, faces)
+
+    assert sum(pouch.dice.values()) == 3
+    assert all(1 <= face <= faces for face in pouch.dice)
+    assert list(pouch.dice) == sorted(pouch.dice)
+
+
+@pytest.mark.parametrize('n, dice, dropped, simple, compressed', (
+    (0, {1: 2, 3: 1, 6: 2}, {}, '(1+1+3+6+6)', '(2x1+1x3+2x6)'),
+    (1, {1: 1, 3: 1, 6: 2}, {1: 1}, '(1+3+6+6[+1])', '(1x1+1x3+2x6[+1x1])'),
+    (2, {3: 1, 6: 2}, {1: 2}, '(3+6+6[+1+1])', '(1x3+2x6[+2x1])'),
+    (3, {6: 2}, {1: 2, 3: 1}, '(6+6[+1+1+3])', '(2x6[+2x1+1x3])'),
+    (4, {6: 1}, {1: 2, 3: 1, 6: 1}, '(6[+1+1+3+6])', '(1x6[+2x1+1x3+1x6])'),
+    (5, {}, {1: 2, 3: 1, 6: 2}, '([+1+1+3+6+6])', '([+2x1+1x3+2x6])'),
+    (6, {}, {1: 2, 3: 1, 6: 2}, '([+1+1+3+6+6])', '([+2x1+1x3+2x6])'),
+))
+def test_dice_pouch_drop_lowest(pouch, n, dice, dropped, simple, compressed):
+    pouch.drop_lowest(n)
+
+    assert pouch.dice == dice
+    assert pouch.dropped == dropped
+    assert pouch.get_sum() == sum(face * count for face, count in dice.items())
+    assert pouch.get_simple_string() == simple
+    assert pouch.get_compressed_string() == compressed
+    assert pouch.get_number_of_faces() == len(dice) + len(dropped)
+
+
+def test_dice_pouch_roll_sorted(dice_score):
+    pouch = dice_score.DicePouch(100, 6)
+
+    assert sum(pouch.dice.values()) == 100
+    assert list(pouch.dice) == sorted(pouch.dice)
+    assert pouch.dropped == {}
+
+
+def test_setup_migrates_nick_column(dice_score, mockbot):
+    mockbot.db.execute(
+        """
+        CREATE TABLE dice_highscores (
+            channel TEXT NOT NULL,
+            nick TEXT NOT NULL,
+            score INTEGER NOT NULL,
+            set_at INTEGER NOT NULL,
+            PRIMARY KEY(channel, nick)
+        )
+        """
+    )
+    # the migration drops scores expired at the time it runs
+    now = int(time.time())
+    expired = now - dice_score.WEEK_SECONDS - 24 * 60 * 60
+    rows = (
+        ('#dice', 'Foo', 12, now - 30),
+        ('#dice', 'foo', 40, now - 20),
+        ('#dice', 'FOO', 25, now - 10),
+        ('#dice', 'Bar[', 7, now),
+        ('#other', 'foo', 3, now),
+        # a higher but expired score doesn't replace a valid one
+        ('#valid', 'Foo', 10, now - 24 * 60 * 60),
+        ('#valid', 'foo', 50, expired),
+        ('#expired', 'Baz', 50, expired),
+    )
+    for row in rows:
+        mockbot.db.execute(
+            "INSERT INTO dice_highscores(channel, nick, score, set_at) "
+            "VALUES (?, ?, ?, ?)",
+            row,
+        )
+
+    dice_score.setup(mockbot)
+
+    assert _stored_scores(mockbot) == [
+        ('#dice', 'bar{', 'Bar[', 7, now),
+        ('#dice', 'foo', 'foo', 40, now - 20),
+        ('#other', 'foo', 'foo', 3, now),
+        ('#valid', 'foo', 'Foo', 10, now - 24 * 60 * 60),
+    ]
+
+
+def test_setup_keeps_migrated_table(dice_score, scorebot):
+    dice_score._update_highscore(scorebot, '#dice', 'Foo', 12, now=NOW)
+
+    dice_score.setup(scorebot)
+
+    assert _stored_scores(scorebot) == [('#dice', 'foo', 'Foo', 12, NOW)]
+
+
+def test_update_highscore_folds_nicks(dice_score, scorebot):
+    update = dice_score._update_highscore
+
+    assert update(scorebot, '#dice', 'Foo', 12, now=NOW) is None
+    assert update(scorebot, '#dice', 'foo', 30, now=NOW + 1) == 12
+    assert update(scorebot, '#dice', 'FOO', 5, now=NOW + 2) == 30
+    assert update(scorebot, '#other', 'FOO', 5, now=NOW + 3) is None
+
+    assert _stored_scores(scorebot) == [
+        ('#dice', 'foo', 'foo', 30, NOW + 1),
+        ('#other', 'foo', 'FOO', 5, NOW + 3),
+    ]
+
+
+def test_update_highscore_expired(dice_score, scorebot):
+    update = dice_score._update_highscore
+    later = NOW + dice_score.WEEK_SECONDS + 1
+    update(scorebot, '#dice', 'Foo', 50, now=NOW)
+
+    # the old score has expired: it is neither returned nor kept
+    assert update(scorebot, '#dice', 'foo', 10, now=later) is None
+    assert _stored_scores(scorebot) == [('#dice', 'foo', 'foo', 10, later)]
+
+
+def test_update_highscore_expired_not_purged(
+    dice_score, scorebot, monkeypatch,
+):
+    update = dice_score._update_highscore
+    later = NOW + dice_score.WEEK_SECONDS + 1
+    update(scorebot, '#dice', 'Foo', 50, now=NOW)
+    monkeypatch.setattr(dice_score, '_last_purge', later)
+
+    # the expired row is still stored, but overwritten by a lower score
+    assert update(scorebot, '#dice', 'foo', 10, now=later) is None
+    assert _stored_scores(scorebot) == [('#dice', 'foo', 'foo', 10, later)]
+
+
+def test_update_highscore_purge_throttle(dice_score, scorebot, monkeypatch):
+    update = dice_score._update_highscore
+    later = NOW + dice_score.WEEK_SECONDS + 1
+    update(scorebot, '#dice', 'Foo', 50, now=NOW)
+    monkeypatch.setattr(dice_score, '_last_purge', later - 1)
+
+    update(scorebot, '#dice', 'Bar', 10, now=later)
+    assert len(_stored_scores(scorebot)) == 2, 'Purged too soon'
+
+    update(scorebot, '#dice', 'Bar', 10, now=later + dice_score.PURGE_INTERVAL)
+    assert _stored_scores(scorebot) == [('#dice', 'bar', 'Bar', 10, later)]
+
+
+def test_update_highscore_failed_purge(dice_score, scorebot, monkeypatch):
+    update = dice_score._update_highscore
+    later = NOW + dice_score.WEEK_SECONDS + 1
+    update(scorebot, '#dice', 'Foo', 50, now=NOW)
+    monkeypatch.setattr(dice_score, '_last_purge', 0)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(dice_score, '_UPSERT_HIGHSCORE', 'NOT SQL')
+        with pytest.raises(sqlite3.OperationalError):
+            update(scorebot, '#dice', 'Bar', 10, now=later)
+
+    # the purge was rolled back, and is not throttled
+    assert dice_score._last_purge == 0
+    assert len(_stored_scores(scorebot)) == 1
+
+    update(scorebot, '#dice', 'Bar', 10, now=later + 1)
+    assert _stored_scores(scorebot) == [('#dice', 'bar', 'Bar', 10, later + 1)]
+
+
+def test_bulk_update_highscores(dice_score, scorebot):
+    dice_score._update_highscore(scorebot, '#dice', 'Bar', 20, now=NOW)
+
+    dice_score._bulk_update_highscores(scorebot, [
+        ('#dice', 'Foo', 12, NOW + 1),
+        ('#dice', 'FOO', 30, NOW + 2),
+        ('#dice', 'foo', 5, NOW + 3),
+        ('#dice', 'BAR', 15, NOW + 4),
+        ('#other', 'Foo', 1, NOW + 5),
+    ])
+
+    assert _stored_scores(scorebot) == [
+        ('#dice', 'bar', 'Bar', 20, NOW),
+        ('#dice', 'foo', 'FOO', 30, NOW + 2),
+        ('#other', 'foo', 'Foo', 1, NOW + 5),
+    ]
+
+
+def test_setup_keeps_sqlite_defaults(dice_score, scorebot):
+    listener = dice_score._set_sqlite_synchronous
+
+    assert not event.contains(scorebot.db.engine, 'connect', listener)
+    assert scorebot.db.execute('PRAGMA journal_mode').scalar() != 'wal'
+
+
+def test_shutdown_removes_listener(dice_score, mockbot):
+    listener = dice_score._set_sqlite_synchronous
+    mockbot.settings.define_section('dice', dice_score.DiceSection)
+    mockbot.settings.dice.sqlite_fast_writes = True
+    dice_score.setup(mockbot)
+    assert mockbot.db.execute('PRAGMA journal_mode').scalar() == 'wal'
+    assert event.contains(mockbot.db.engine, 'connect', listener)
+
+    dice_score.shutdown(mockbot)
+    assert not event.contains(mockbot.db.engine, 'connect', listener)
+
+    # nothing left to remove
+    dice_score.shutdown(mockbot)
@@ -0,0 +1,196 @@
+"""Tests for Sopel's ``pronouns`` plugin"""
+from __future__ import annotations
+
+import pytest
+import requests.exceptions
+
+from sopel.builtins import pronouns
+from sopel.tests import rawlist
+
+
+TMP_CONFIG = """
+[core]
+owner = Admin
+nick = Sopel
+enable =
+    pronouns
+host = irc.libera.chat
+db_filename = {db_filename}
+
+[pronouns]
+fetch_complete_list = {fetch}
+"""
+
+PRONOUNS_URL = (
+    'https://github.com/sopel-irc/pronoun-service/raw/main/src/lib/data/'
+    'pronouns.tab'
+)
+
+
+@pytest.fixture
+def tmpconfig(configfactory, tmpdir):
+    content = TMP_CONFIG.format(
+        db_filename=tmpdir.join('test.sqlite'), fetch='false')
+    return configfactory('default.ini', content)
+
+
+@pytest.fixture
+def bot(botfactory, tmpconfig):
+    return botfactory.preloaded(tmpconfig, ['pronouns'])
+
+
+@pytest.fixture
+def irc(bot, ircfactory):
+    return ircfactory(bot)
+
+
+@pytest.fixture
+def user(userfactory):
+    return userfactory('User')
+
+
+SET_PRONOUNS = (
+    # full sets are stored as given, known or not
+    ('fae/faer/faer/faers/faerself', 'fae/faer/faer/faers/faerself', ''),
+    # prefix
+    ('she/her', 'she/her/her/hers/herself', ''),
+    ('xey', 'xey/xem/xyr/xyrs/xemself', ''),
+    # "they/.../themself"
+    ('they/.../themself', 'they/them/their/theirs/themself', ''),
+    # "they/them/theirs"
+    ('ze/zir/zirs', 'ze/zir/zir/zirs/zirself', ''),
+    # matched both as a prefix and as subject/object/possessive
+    ('he/him/his', 'he/him/his/his/himself', ''),
+    # ambiguous, listed in the order of the known sets
+    (
+        'they/them',
+        'they/them/their/theirs/themselves',
+        ' Or, if you meant one of these, please tell me: '
+        'they/them/their/theirs/themself',
+    ),
+    (
+        'they/them/theirs',
+        'they/them/their/theirs/themselves',
+        ' Or, if you meant one of these, please tell me: '
+        'they/them/their/theirs/themself',
+    ),
+    (
+        'they/them/their/theirs',
+        'they/them/their/theirs/themselves',
+        ' Or, if you meant one of these, please tell me: '
+        'they/them/their/theirs/themself',
+    ),
+    (
+        'ze',
+        'ze/hir/hir/hirs/hirself',
+        ' Or, if you meant one of these, please tell me: '
+        'ze/zir/zir/zirs/zirself',
+    ),
+)
+
+
+@pytest.mark.parametrize('requested, stored, disambig', SET_PRONOUNS)
+def test_set_pronouns(irc, bot, user, requested, stored, disambig):
+    irc.pm(user, '.setpronouns %s' % requested)
+
+    assert bot.db.get_nick_value('User', 'pronouns') == stored
+    assert bot.backend.message_sent == rawlist(
+        "PRIVMSG User :User: Thanks for telling me! "
+        "I'll remember you use %s.%s" % (stored, disambig)
+    )
+
+
+@pytest.mark.parametrize('requested', (
+    'foo/bar',
+    'they/.../foo',
+    'she/her/theirs',
+))
+def test_set_pronouns_unknown(irc, bot, user, requested):
+    irc.pm(user, '.setpronouns %s' % requested)
+
+    assert bot.db.get_nick_value('User', 'pronouns') is None
+    assert len(bot.backend.message_sent) == 1
+    assert "I'm sorry, I don't know those pronouns." in (
+        bot.backend.message_sent[0].decode('utf-8'))
+
+
+@pytest.mark.parametrize('stored, short', (
+    ('they/them/their/theirs/themself', 'they/.../themself'),
+    ('ze/zir/zir/zirs/zirself', 'ze/zir'),
+    # unknown sets link to themselves
+    ('fae/faer/faer/faers/faerself', 'fae/faer/faer/faers/faerself'),
+))
+def test_say_pronouns(irc, bot, user, stored, short):
+    bot.db.set_nick_value('User', 'pronouns', stored)
+
+    irc.pm(user, '.pronouns')
+
+    assert bot.backend.message_sent == rawlist(
+        "PRIVMSG User :User's pronouns are %s. "
+        "See https://pronouns.sopel.chat/%s for examples." % (stored, short)
+    )
+
+
+def test_say_pronouns_ambiguous_short(irc, bot, user):
+    bot.memory['pronoun_sets'] = {
+        'they/them': 'they/them/their/theirs/themselves',
+        'they/.../themselves': 'they/them/their/theirs/themselves',
+    }
+    pronouns._index_pronoun_sets(bot)
+    bot.db.set_nick_value(
+        'User', 'pronouns', 'they/them/their/theirs/themselves')
+
+    irc.pm(user, '.pronouns')
+
+    # if ambiguous, the earlier short form is used
+    assert bot.backend.message_sent == rawlist(
+        "PRIVMSG User :User's pronouns are they/them/their/theirs/themselves. "
+        "See https://pronouns.sopel.chat/they/them for examples."
+    )
+
+
+@pytest.fixture
+def fetching_config(configfactory, tmpdir):
+    content = TMP_CONFIG.format(
+        db_filename=tmpdir.join('test.sqlite'), fetch='true')
+    return configfactory('default.ini', content)
+
+
+def test_fetch_pronoun_sets(botfactory, fetching_config, requests_mock):
+    body = (
+        'they\tthem\ttheir\ttheirs\tthemselves\n'
+        '\n'
+        'she\ther\ther\thers\therself\n'
+        'sie\thir\thir\thirs\thirself\n'
+        'ël\tëm\tër\tërs\tëmself\n'
+    )
+    # no charset: the body must still be decoded as UTF-8
+    requests_mock.get(PRONOUNS_URL, content=body.encode('utf-8'))
+
+    bot = botfactory.preloaded(fetching_config, ['pronouns'])
+
+    assert bot.memory['pronoun_sets'] == {
+        'they': 'they/them/their/theirs/themselves',
+        'she': 'she/her/her/hers/herself',
+        'sie': 'sie/hir/hir/hirs/hirself',
+        'ël': 'ël/ëm/ër/ërs/ëmself',
+    }
+    assert bot.memory['pronoun_sets_inverse'][
+        'ël/ëm/ër/ërs/ëmself'] == 'ël'
+
+
+@pytest.mark.parametrize('response', (
+    {'status_code': 404},
+    {'exc': requests.exceptions.ConnectTimeout},
+))
+def test_fetch_pronoun_sets_failure(
+    botfactory, fetching_config, requests_mock, response,
+):
+    requests_mock.get(PRONOUNS_URL, **response)
+
+    bot = botfactory.preloaded(fetching_config, ['pronouns'])
+
+    # the hard-coded default sets are kept
+    assert len(bot.memory['pronoun_sets']) == 10
+    assert bot.memory['pronoun_sets']['they/.../themself'] == (
+        'they/them/their/theirs/themself')
@@ -0,0 +1,42 @@
+# Mock plugin loaded by the tests in test_plugins.py
+from __future__ import annotations
+
+from sopel import plugin
+
+
+@plugin.commands("first")
+def first_command(bot, trigger):
+    pass
+
+
+@plugin.commands("second")
+def second_command(bot, trigger):
+    pass
+
+
+@plugin.interval(5)
+def interval5s(bot):
+    pass
+
+
+@plugin.interval(10)
+def interval10s(bot):
+    pass
+
+
+@plugin.url(r'.\.example\.com')
+def example_url(bot):
+    pass
+
+
+@plugin.event('TOPIC')
+def on_topic_command(bot):
+    pass
+
+
+def shutdown():
+    pass
+
+
+def ignored():
+    pass
@@ -2,6 +2,8 @@
 from __future__ import annotations
 
 import importlib.metadata
+import pathlib
+import shutil
 import sys
 
 import pytest
@@ -9,152 +11,109 @@ import pytest
 from sopel import plugins
 
 
-MOCK_MODULE_CONTENT = """from __future__ import annotations
-from sopel import plugin
+MOCK_PLUGIN_MEMBERS = (
+    'first_command',
+    'second_command',
+    'interval5s',
+    'interval10s',
+    'example_url',
+    'shutdown',
+    'ignored',
+)
 
 
-@plugin.commands("first")
-def first_command(bot, trigger):
-    pass
+@pytest.fixture(scope='session')
+def mock_plugin_src():
+    return pathlib.Path(__file__).parent / 'data' / 'mock_plugin.py'
 
 
-@plugin.commands("second")
-def second_command(bot, trigger):
-    pass
+@pytest.fixture(scope='session')
+def mock_plugin_file(tmp_path_factory, mock_plugin_src):
+    root = tmp_path_factory.mktemp('loader_mods')
+    mod_file = root / 'file_mod.py'
+    shutil.copy(mock_plugin_src, mod_file)
 
+    return mod_file
 
-@plugin.interval(5)
-def interval5s(bot):
-    pass
 
+@pytest.fixture(scope='session')
+def mock_plugin_package(tmp_path_factory, mock_plugin_src):
+    root = tmp_path_factory.mktemp('loader_mods')
+    package_dir = root / 'dir_mod'
+    package_dir.mkdir()
+    shutil.copy(mock_plugin_src, package_dir / '__init__.py')
 
-@plugin.interval(10)
-def interval10s(bot):
-    pass
+    return package_dir
 
 
-@plugin.url(r'.\\.example\\.com')
-def example_url(bot):
-    pass
-
-
-@plugin.event('TOPIC')
-def on_topic_command(bot):
-    pass
-
-
-def shutdown():
-    pass
-
-
-def ignored():
-    pass
-
-"""
-
-
-def test_plugin_load_pymod(tmpdir):
-    root = tmpdir.mkdir('loader_mods')
-    mod_file = root.join('file_mod.py')
-    mod_file.write(MOCK_MODULE_CONTENT)
-
-    plugin = plugins.handlers.PyFilePlugin(mod_file.strpath)
-    plugin.load()
-
-    test_mod = plugin._module
-
-    assert hasattr(test_mod, 'first_command')
-    assert hasattr(test_mod, 'second_command')
-    assert hasattr(test_mod, 'interval5s')
-    assert hasattr(test_mod, 'interval10s')
-    assert hasattr(test_mod, 'example_url')
-    assert hasattr(test_mod, 'shutdown')
-    assert hasattr(test_mod, 'ignored')
-
-
-def test_plugin_load_pymod_bad_file_pyc(tmpdir):
-    root = tmpdir.mkdir('loader_mods')
-    test_file = root.join('file_module.pyc')
-    test_file.write('')
-
-    with pytest.raises(Exception):
-        plugins.handlers.PyFilePlugin(test_file.strpath)
-
-
-def test_plugin_load_pymod_bad_file_no_ext(tmpdir):
-    root = tmpdir.mkdir('loader_mods')
-    test_file = root.join('file_module')
-    test_file.write('')
+@pytest.fixture
+def loaded_plugin(
+    request, monkeypatch, mock_plugin_file, mock_plugin_package,
+):
+    if request.param == 'pyfile':
+        plugin = plugins.handlers.PyFilePlugin(str(mock_plugin_file))
+        plugin.load()
+    elif request.param == 'pypackage':
+        plugin = plugins.handlers.PyFilePlugin(str(mock_plugin_package))
+        plugin.load()
+    elif request.param == 'entry_point':
+        # set up for manual load/import; undone by monkeypatch after the test
+        monkeypatch.syspath_prepend(str(mock_plugin_file.parent))
+        # import from sys.path, not a module left over by the PyFilePlugin
+        # tests, and don't leave this one behind either
+        sys.modules.pop('file_mod', None)
 
-    with pytest.raises(Exception):
-        plugins.handlers.PyFilePlugin(test_file.strpath)
+        entry_point = importlib.metadata.EntryPoint(
+            'test_plugin', 'file_mod', 'sopel.plugins')
+        plugin = plugins.handlers.EntryPointPlugin(entry_point)
+        plugin.load()
+        sys.modules.pop('file_mod', None)
+    else:
+        raise ValueError('Unknown plugin loader: %r' % request.param)
 
+    return plugin
 
-def test_plugin_load_pypackage(tmpdir):
-    root = tmpdir.mkdir('loader_mods')
-    package_dir = root.mkdir('dir_mod')
-    mod_file = package_dir.join('__init__.py')
-    mod_file.write(MOCK_MODULE_CONTENT)
 
-    plugin = plugins.handlers.PyFilePlugin(package_dir.strpath)
-    plugin.load()
+@pytest.mark.parametrize('loaded_plugin, name', (
+    ('pyfile', 'file_mod'),
+    ('pypackage', 'dir_mod'),
+    ('entry_point', 'test_plugin'),
+), indirect=['loaded_plugin'])
+def test_plugin_load(loaded_plugin, name):
+    assert loaded_plugin.name == name
 
-    test_mod = plugin._module
+    test_mod = loaded_plugin._module
 
-    assert hasattr(test_mod, 'first_command')
-    assert hasattr(test_mod, 'second_command')
-    assert hasattr(test_mod, 'interval5s')
-    assert hasattr(test_mod, 'interval10s')
-    assert hasattr(test_mod, 'example_url')
-    assert hasattr(test_mod, 'shutdown')
-    assert hasattr(test_mod, 'ignored')
+    for member in MOCK_PLUGIN_MEMBERS:
+        assert hasattr(test_mod, member)
 
 
-def test_plugin_load_pypackage_bad_dir_empty(tmpdir):
-    root = tmpdir.mkdir('loader_mods')
-    package_dir = root.mkdir('dir_package')
+def _build_bad_plugin_path(root, kind):
+    if kind == 'pyc':
+        target = root / 'file_module.pyc'
+        target.write_text('')
+    elif kind == 'no_ext':
+        target = root / 'file_module'
+        target.write_text('')
+    elif kind == 'empty_dir':
+        target = root / 'dir_package'
+        target.mkdir()
+    elif kind == 'no_init':
+        target = root / 'dir_package'
+        target.mkdir()
+        (target / 'no_init.py').write_text('')
+    else:
+        raise ValueError('Unknown bad plugin path kind: %r' % kind)
 
-    with pytest.raises(Exception):
-        plugins.handlers.PyFilePlugin(package_dir.strpath)
+    return target
 
 
-def test_plugin_load_pypackage_bad_dir_no_init(tmpdir):
-    root = tmpdir.mkdir('loader_mods')
-    package_dir = root.mkdir('dir_package')
-    package_dir.join('no_init.py').write('')
+@pytest.mark.parametrize('kind', ['pyc', 'no_ext', 'empty_dir', 'no_init'])
+def test_plugin_load_bad_path(tmp_path, kind):
+    target = _build_bad_plugin_path(tmp_path, kind)
 
     with pytest.raises(Exception):
-        plugins.handlers.PyFilePlugin(package_dir.strpath)
-
-
-def test_plugin_load_entry_point(tmpdir):
-    root = tmpdir.mkdir('loader_mods')
-    mod_file = root.join('file_mod.py')
-    mod_file.write(MOCK_MODULE_CONTENT)
-
-    # set up for manual load/import
-    sys.path.append(root.strpath)
-
-    # load the entry point
-    try:
-        entry_point = importlib.metadata.EntryPoint(
-            'test_plugin', 'file_mod', 'sopel.plugins')
-        plugin = plugins.handlers.EntryPointPlugin(entry_point)
-        plugin.load()
-    finally:
-        sys.path.remove(root.strpath)
-
-    assert plugin.name == 'test_plugin'
-
-    test_mod = plugin._module
-
-    assert hasattr(test_mod, 'first_command')
-    assert hasattr(test_mod, 'second_command')
-    assert hasattr(test_mod, 'interval5s')
-    assert hasattr(test_mod, 'interval10s')
-    assert hasattr(test_mod, 'example_url')
-    assert hasattr(test_mod, 'shutdown')
-    assert hasattr(test_mod, 'ignored')
+        plugins.handlers.PyFilePlugin(str(target))
 
 
 def test_plugin_skip_broken_links(tmp_path):